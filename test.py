@@ -1,13 +1,370 @@
+import asyncio
+import codecs
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import aiohttp
+from aiohttp.resolver import AsyncResolver
+from io import BytesIO
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
 from urllib.parse import urljoin, urlparse
-import re
-from xml.etree.ElementTree import Element, SubElement
-from datetime import datetime
+from lxml import etree
+from xml.sax.saxutils import escape
+from datetime import datetime, timezone
+from functools import lru_cache
 import dateutil.parser
+import html
 import logging
+import os
+import re
+import sys
+import threading
 import uuid
 
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    # Decoded transparently by requests and aiohttp; br needs the brotli package
+    'Accept-Encoding': 'gzip, deflate, br',
+}
+
+# Shared session so repeated requests to the same host reuse connections
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Upper bounds on page fetches in flight, overall and against a single host
+MAX_CONNECTIONS = 200
+MAX_PER_HOST = 8
+
+# Crawls at least this large parse pages in a process pool rather than
+# threads, since lxml parsing holds the GIL
+PROCESS_POOL_MIN_URLS = 200
+
+# Metadata lives in <head>, so stop downloading once it has been seen or
+# after MAX_HEAD_BYTES, whichever comes first
+MAX_HEAD_BYTES = 256 * 1024
+CHUNK_SIZE = 16 * 1024
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+_HEAD_END_RE = re.compile(rb'</head\s*>', re.I)
+# <meta charset=...> or <meta http-equiv=... content="...; charset=...">
+_META_CHARSET_RE = re.compile(rb'<meta\b[^>]*charset\s*=', re.I)
+
+# Control characters that are not allowed anywhere in an XML 1.0 document
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_ATTR_ENTITIES = {'"': '&quot;'}
+
+# Regex fast path for <head> metadata, see scan_head()
+_SKIP_RE = re.compile(
+    rb'<!--[^-]*(?:-(?!->)[^-]*)*-->|<script\b[^<]*(?:<(?!/script\s*>)[^<]*)*</script\s*>',
+    re.I)
+_UNCLOSED_SKIP_RE = re.compile(rb'<!--|<script\b', re.I)
+_META_TAG_RE = re.compile(rb'''<meta\b((?:[^>"']|"[^"]*"|'[^']*')*)>''', re.I)
+_ATTR_RE = re.compile(rb'''([^\s"'>/=]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''')
+_TITLE_RE = re.compile(rb'<title\b[^>]*>(.*?)</title\s*>', re.I | re.S)
+
+# Per-thread cache of lxml HTML parsers, see html_parser()
+_parsers = threading.local()
+
+# Shared stand-in for a missing metadata sub-dict; never mutated
+_EMPTY = {}
+
+def utc_now_iso():
+    """Current UTC time as an Atom timestamp, e.g. 2024-01-02T03:04:05Z."""
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace('+00:00', 'Z')
+
+def normalize_url(url):
+    """Add a scheme to the URL if it is missing."""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+def is_html(content_type):
+    """Whether a Content-Type header value is worth parsing for metadata."""
+    # Servers that omit the header are given the benefit of the doubt
+    return not content_type or content_type.split(';', 1)[0].strip().lower() in HTML_CONTENT_TYPES
+
+def head_complete(buf, chunk_len):
+    """Whether buf, just extended by chunk_len bytes, has the whole <head>."""
+    if len(buf) >= MAX_HEAD_BYTES:
+        return True
+    # Only the new bytes (plus overlap for a split tag) need searching
+    start = max(0, len(buf) - chunk_len - 16)
+    return _HEAD_END_RE.search(buf, start) is not None
+
+@lru_cache(maxsize=64)
+def normalize_encoding(encoding):
+    """
+    Name to hand libxml2 for a server-declared charset, or None if unusable.
+    
+    The label is tried as sent first, since libxml2 knows names Python does
+    not (e.g. 'windows-874') and rejects some of Python's own codec names
+    (e.g. 'euc_jp'). Only then is Python's name for it tried, which rescues
+    aliases such as 'latin-1'. Anything neither recognises is dropped.
+    """
+    if not encoding:
+        return None
+    label = encoding.strip().strip('"\'')
+    try:
+        lxml.html.HTMLParser(encoding=label)
+        return label
+    except LookupError:
+        pass
+    try:
+        name = codecs.lookup(label).name
+        lxml.html.HTMLParser(encoding=name)
+    except LookupError:
+        return None
+    return name
+
+def document_encoding(body, from_encoding=None):
+    """
+    Encoding to parse a page with, or None to let libxml2 work it out.
+    
+    libxml2 honours a <meta> charset but otherwise assumes Latin-1, where
+    BeautifulSoup would have detected UTF-8. So when nothing is declared and
+    the bytes are valid UTF-8, say so explicitly.
+    """
+    encoding = normalize_encoding(from_encoding)
+    if encoding is not None or _META_CHARSET_RE.search(body):
+        return encoding
+    try:
+        # Not final: the body may have been cut off mid-character
+        codecs.getincrementaldecoder('utf-8')().decode(body, final=False)
+    except UnicodeDecodeError:
+        return None
+    return 'utf-8'
+
+def html_parser(encoding=None):
+    """
+    HTML parser for the current thread, reused across pages.
+    
+    lxml parsers lock while in use, so each thread keeps its own rather than
+    sharing one; they are keyed by the normalised encoding name.
+    """
+    encoding = normalize_encoding(encoding)
+    parsers = getattr(_parsers, 'by_encoding', None)
+    if parsers is None:
+        parsers = _parsers.by_encoding = {}
+    parser = parsers.get(encoding)
+    if parser is None:
+        parser = parsers[encoding] = lxml.html.HTMLParser(encoding=encoding)
+    return parser
+
+def init_parse_worker():
+    """ProcessPoolExecutor initializer that sets up the worker's parser."""
+    html_parser()
+
+def scan_head(body, from_encoding=None):
+    """
+    Pull <head> metadata out of raw HTML with regular expressions.
+    
+    This is the fast path for parse_metadata(): OpenGraph and Twitter tags
+    are standard and live in <head>, so for most pages there is no need to
+    build a DOM at all. Comments and <script> blocks are cut out first so
+    tags inside them are not picked up.
+    
+    Args:
+        body (bytes): The raw HTML document
+        from_encoding (str, optional): Encoding declared by the server
+        
+    Returns:
+        tuple: (opengraph, twitter, title, description), or None when the
+            page needs parse_head() instead: no OpenGraph or Twitter tags,
+            an http-equiv header, an unterminated comment or script, or an
+            encoding the scan cannot decode with
+    """
+    head_end = _HEAD_END_RE.search(body)
+    head = body[:head_end.start()] if head_end else body
+    head = _SKIP_RE.sub(b'', head)
+    if _UNCLOSED_SKIP_RE.search(head):
+        return None
+    
+    found = []
+    description = None
+    meta_charset = None
+    for tag in _META_TAG_RE.finditer(head):
+        attrs = {}
+        for attr in _ATTR_RE.finditer(tag.group(1)):
+            value = attr.group(2)
+            if value is None:
+                value = attr.group(3) if attr.group(3) is not None else attr.group(4)
+            attrs.setdefault(attr.group(1).lower(), value)
+        
+        if b'http-equiv' in attrs:
+            # Leave Content-Type and friends to libxml2
+            return None
+        if meta_charset is None and b'charset' in attrs:
+            meta_charset = attrs[b'charset'].decode('ascii', 'ignore')
+        content = attrs.get(b'content')
+        if not content:
+            continue
+        prop = attrs.get(b'property', b'')
+        if prop.startswith(b'og:'):
+            if len(prop) > 3:
+                found.append(('og', prop[3:], content))
+        elif prop.startswith(b'article:'):
+            found.append(('og', prop, content))
+        name = attrs.get(b'name', b'')
+        if name.startswith(b'twitter:'):
+            if len(name) > 8:
+                found.append(('twitter', name[8:], content))
+        elif description is None and name.lower() == b'description':
+            description = content
+    
+    if not found:
+        return None
+    
+    # Same choice of encoding as parse_head() makes via document_encoding()
+    encoding = normalize_encoding(from_encoding) or normalize_encoding(meta_charset)
+    if encoding is None:
+        if meta_charset is not None:
+            return None
+        encoding = 'utf-8'
+    try:
+        codecs.lookup(encoding)
+        
+        def decode(value):
+            return html.unescape(value.decode(encoding))
+        
+        opengraph, twitter = {}, {}
+        for kind, key, content in found:
+            # The same handful of keys recur on every page, so intern them
+            target = opengraph if kind == 'og' else twitter
+            target[sys.intern(decode(key))] = decode(content)
+        
+        title_match = _TITLE_RE.search(head)
+        title = decode(title_match.group(1)) if title_match else None
+        if description is not None:
+            description = decode(description)
+    except (UnicodeDecodeError, LookupError):
+        return None
+    
+    return opengraph, twitter, title, description
+
+def parse_head(body, from_encoding=None):
+    """
+    Pull <head> metadata out of an HTML document by parsing it with lxml.
+    
+    Slower than scan_head() but copes with whatever markup it is given.
+    
+    Args:
+        body (bytes): The raw HTML document
+        from_encoding (str, optional): Encoding declared by the server
+        
+    Returns:
+        tuple: (opengraph, twitter, title, description)
+    """
+    doc = lxml.html.fromstring(body, parser=html_parser(document_encoding(body, from_encoding)))
+    
+    opengraph, twitter = {}, {}
+    description = None
+    
+    # Extract OpenGraph, Twitter and description metadata in a single pass
+    # over <meta>
+    for tag in doc.xpath('//meta[@property or @name]'):
+        content = tag.get('content', '')
+        if not content:
+            continue
+        prop = tag.get('property', '')
+        if prop.startswith('og:'):
+            # The same handful of keys recur on every page, so intern them
+            prop = sys.intern(prop[3:])
+            if prop:
+                opengraph[prop] = content
+        elif prop.startswith('article:'):
+            # The OpenGraph article namespace (published/modified time,
+            # author) is unprefixed; keep it alongside the og: properties
+            opengraph[sys.intern(prop)] = content
+        name = tag.get('name', '')
+        if name.startswith('twitter:'):
+            name = sys.intern(name[8:])
+            if name:
+                twitter[name] = content
+        elif description is None and name.lower() == 'description':
+            description = content
+    
+    title = doc.findtext('.//title')
+    
+    return opengraph, twitter, title, description
+
+def parse_metadata(url, body, from_encoding=None):
+    """
+    Parse Twitter and OpenGraph metadata out of an HTML document.
+    
+    Args:
+        url (str): The URL the document was fetched from
+        body (bytes): The raw HTML document
+        from_encoding (str, optional): Encoding declared by the server
+        
+    Returns:
+        dict: Dictionary containing extracted metadata
+    """
+    head = scan_head(body, from_encoding)
+    if head is None:
+        head = parse_head(body, from_encoding)
+    opengraph, twitter, title_text, html_description = head
+    
+    metadata = {
+        'url': url,
+        'title': None,
+        'description': None,
+        'image': None,
+        'site_name': None,
+        'twitter': twitter,
+        'opengraph': opengraph,
+        # Parsed once here and reused when the entry is rendered
+        '_netloc': urlparse(url).netloc
+    }
+    
+    # Populate main fields from OG or Twitter data
+    metadata['title'] = (
+        metadata['opengraph'].get('title') or 
+        metadata['twitter'].get('title') or
+        (title_text.strip() if title_text is not None else None)
+    )
+    
+    metadata['description'] = (
+        metadata['opengraph'].get('description') or 
+        metadata['twitter'].get('description') or
+        html_description
+    )
+    
+    # Handle image URLs (make absolute if relative)
+    image_url = (
+        metadata['opengraph'].get('image') or 
+        metadata['twitter'].get('image')
+    )
+    if image_url:
+        metadata['image'] = urljoin(url, image_url)
+        
+    metadata['site_name'] = (
+        metadata['opengraph'].get('site_name') or
+        metadata['twitter'].get('site') or
+        metadata['_netloc']
+    )
+    
+    return metadata
+
+def parse_page(url, body, from_encoding=None):
+    """
+    Run parse_metadata(), reporting failures as an error dict.
+    
+    lxml's exceptions cannot be pickled, so this is what gets sent to worker
+    processes rather than parse_metadata() itself.
+    """
+    try:
+        return parse_metadata(url, body, from_encoding)
+    except Exception as e:
+        return {'error': f'Parsing failed: {str(e)}', 'url': url}
+
 def extract_metadata(url, timeout=10):
     """
     Extract Twitter and OpenGraph metadata from a URL.
@@ -19,214 +376,304 @@ def extract_metadata(url, timeout=10):
     Returns:
         dict: Dictionary containing extracted metadata
     """
+    url = normalize_url(url)
     try:
-        # Add scheme if missing
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
+        with SESSION.get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
             
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=timeout)
-        response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '')
+            if not is_html(content_type):
+                return {'error': f'Not HTML: {content_type}', 'url': url}
+            
+            body = bytearray()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                body += chunk
+                if head_complete(body, len(chunk)):
+                    break
+            
+            # Only hand the parser an encoding when the server declared one,
+            # otherwise let it sniff the document as before
+            from_encoding = response.encoding if 'charset=' in content_type.lower() else None
         
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # The response is closed by now; rebinding drops the bytearray so only
+        # one copy of the page is held while it is parsed
+        body = bytes(body)
+        return parse_metadata(url, body, from_encoding)
         
-        metadata = {
-            'url': url,
-            'title': None,
-            'description': None,
-            'image': None,
-            'site_name': None,
-            'twitter': {},
-            'opengraph': {}
-        }
+    except requests.RequestException as e:
+        return {'error': f'Request failed: {str(e)}', 'url': url}
+    except Exception as e:
+        return {'error': f'Parsing failed: {str(e)}', 'url': url}
+
+async def fetch_metadata(session, url, host_semaphores, executor=None, timeout=10):
+    """
+    Asynchronous counterpart of extract_metadata().
+    
+    The page is fetched on the shared aiohttp session and parsed in an
+    executor so lxml does not block the event loop.
+    
+    Args:
+        session (aiohttp.ClientSession): Session to fetch with
+        url (str): The URL to extract metadata from
+        host_semaphores (dict): asyncio.Semaphore per host, bounding the
+            number of fetches in flight against each one
+        executor (Executor, optional): Where to parse the page, defaults to
+            the event loop's thread pool
+        timeout (int): Request timeout in seconds
         
-        # Extract OpenGraph metadata
-        og_tags = soup.find_all('meta', property=re.compile(r'^og:'))
-        for tag in og_tags:
-            prop = tag.get('property', '').replace('og:', '')
-            content = tag.get('content', '')
-            if prop and content:
-                metadata['opengraph'][prop] = content
+    Returns:
+        dict: Dictionary containing extracted metadata
+    """
+    url = normalize_url(url)
+    try:
+        async with host_semaphores[urlparse(url).netloc]:
+            async with session.get(url, headers=HEADERS, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                resp.raise_for_status()
                 
-        # Extract Twitter metadata
-        twitter_tags = soup.find_all('meta', attrs={'name': re.compile(r'^twitter:')})
-        for tag in twitter_tags:
-            name = tag.get('name', '').replace('twitter:', '')
-            content = tag.get('content', '')
-            if name and content:
-                metadata['twitter'][name] = content
+                content_type = resp.headers.get('Content-Type', '')
+                if not is_html(content_type):
+                    return {'error': f'Not HTML: {content_type}', 'url': url}
                 
-        # Populate main fields from OG or Twitter data
-        metadata['title'] = (
-            metadata['opengraph'].get('title') or 
-            metadata['twitter'].get('title') or
-            (soup.find('title').get_text().strip() if soup.find('title') else None)
-        )
+                body = bytearray()
+                async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                    body += chunk
+                    if head_complete(body, len(chunk)):
+                        break
+                from_encoding = resp.charset
         
-        metadata['description'] = (
-            metadata['opengraph'].get('description') or 
-            metadata['twitter'].get('description') or
-            (soup.find('meta', attrs={'name': 'description'}) or {}).get('content')
-        )
+        # The connection is released by now. Rebinding drops the bytearray so
+        # this frame does not keep a second copy of the page alive while the
+        # executor parses it
+        body = bytes(body)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, parse_page, url, body, from_encoding)
         
-        # Handle image URLs (make absolute if relative)
-        image_url = (
-            metadata['opengraph'].get('image') or 
-            metadata['twitter'].get('image')
-        )
-        if image_url:
-            metadata['image'] = urljoin(url, image_url)
-            
-        metadata['site_name'] = (
-            metadata['opengraph'].get('site_name') or
-            metadata['twitter'].get('site') or
-            urlparse(url).netloc
-        )
-        
-        return metadata
-        
-    except requests.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         return {'error': f'Request failed: {str(e)}', 'url': url}
     except Exception as e:
         return {'error': f'Parsing failed: {str(e)}', 'url': url}
 
-def enrich_atom_entry(metadata, base_entry=None):
+async def fetch_all_metadata(urls):
+    """Fetch metadata for all URLs concurrently, preserving input order"""
+    # Sitemap URLs usually all share one origin, so the per-host cap is the
+    # one that matters in practice
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(MAX_PER_HOST))
+    # aiodns resolves without going through getaddrinfo on a thread pool, and
+    # the connector caches the answers for the rest of the crawl. The
+    # connector does not own a resolver it is given, so it is closed below
+    resolver = AsyncResolver()
+    connector = aiohttp.TCPConnector(
+        limit=MAX_CONNECTIONS,
+        limit_per_host=MAX_PER_HOST,
+        resolver=resolver,
+        use_dns_cache=True,
+        ttl_dns_cache=600,
+        enable_cleanup_closed=True,
+        keepalive_timeout=30,
+    )
+    executor = None
+    if len(urls) >= PROCESS_POOL_MIN_URLS:
+        executor = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_parse_worker)
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            return await asyncio.gather(
+                *[fetch_metadata(session, url, host_semaphores, executor) for url in urls],
+                return_exceptions=True,
+            )
+    finally:
+        await resolver.close()
+        if executor is not None:
+            executor.shutdown()
+
+def xml_safe(value):
+    """Drop characters XML 1.0 does not allow anywhere in a document."""
+    return _INVALID_XML_CHARS.sub('', value)
+
+def xml_text(value):
+    """Escape a value for use as XML character data."""
+    return escape(xml_safe(str(value)))
+
+def xml_attr(value):
+    """Escape a value for use inside a double-quoted XML attribute."""
+    return escape(xml_safe(str(value)), _ATTR_ENTITIES)
+
+def parse_timestamp(value):
     """
-    Create or enrich an Atom entry element with extracted metadata.
+    Parse an OpenGraph timestamp into a datetime.
+    
+    These are nearly always ISO 8601, which datetime.fromisoformat() handles
+    natively (including a trailing 'Z' on 3.11+); anything else falls back
+    to dateutil's much slower generic parser.
+    
+    Atom needs an offset on every timestamp, so values without one (e.g.
+    '2024-01-02') are taken to be UTC.
+    """
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        dt = dateutil.parser.parse(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+@lru_cache(maxsize=1024)
+def source_id(netloc):
+    """Escaped Atom <source> id for a host, shared by all entries from it."""
+    return xml_text('urn:source:' + netloc)
+
+def enrich_atom_entry(metadata, parts=None, now_iso=None, entry_id=None):
+    """
+    Render an Atom entry for the extracted metadata as XML text.
+    
+    The feed is only ever serialised once, in document order, so entries are
+    written straight out as indented lines instead of building a tree first.
     
     Args:
         metadata (dict): Metadata from extract_metadata()
-        base_entry (Element, optional): Existing entry to enrich
+        parts (list, optional): List of lines to append the entry to
+        now_iso (str, optional): Timestamp to use for generated <updated>
+            elements, defaults to the current UTC time
+        entry_id (str, optional): Value for the entry <id>, defaults to the
+            metadata URL
         
     Returns:
-        Element: Atom entry element
+        list: parts, with the entry's lines appended
     """
-    if base_entry is None:
-        entry = Element('entry')
-    else:
-        entry = base_entry
+    if parts is None:
+        parts = []
+    if now_iso is None:
+        now_iso = utc_now_iso()
+    
+    og = metadata.get('opengraph') or _EMPTY
+    tw = metadata.get('twitter') or _EMPTY
+    
+    parts.append('    <entry>')
     
     # Title
     if metadata.get('title'):
-        title_elem = entry.find('title')
-        if title_elem is None:
-            title_elem = SubElement(entry, 'title')
-        title_elem.text = metadata['title']
-        title_elem.set('type', 'text')
+        parts.append(f'        <title type="text">{xml_text(metadata["title"])}</title>')
     
     # Summary/Description
     if metadata.get('description'):
-        summary_elem = entry.find('summary')
-        if summary_elem is None:
-            summary_elem = SubElement(entry, 'summary')
-        summary_elem.text = metadata['description']
-        summary_elem.set('type', 'text')
+        parts.append(f'        <summary type="text">{xml_text(metadata["description"])}</summary>')
     
     # Link to original content
     if metadata.get('url'):
-        link_elem = SubElement(entry, 'link')
-        link_elem.set('rel', 'alternate')
-        link_elem.set('type', 'text/html')
-        link_elem.set('href', metadata['url'])
+        parts.append(f'        <link rel="alternate" type="text/html" href="{xml_attr(metadata["url"])}"/>')
     
     # Image as enclosure
     if metadata.get('image'):
-        enclosure_elem = SubElement(entry, 'link')
-        enclosure_elem.set('rel', 'enclosure')
-        enclosure_elem.set('type', 'image/jpeg')  # You might want to detect actual type
-        enclosure_elem.set('href', metadata['image'])
+        # You might want to detect actual type
+        parts.append(f'        <link rel="enclosure" type="image/jpeg" href="{xml_attr(metadata["image"])}"/>')
     
     # Content type as category
-    og_type = metadata.get('opengraph', {}).get('type')
+    og_type = og.get('type')
     if og_type:
-        category_elem = SubElement(entry, 'category')
-        category_elem.set('term', og_type)
-        category_elem.set('scheme', 'http://ogp.me/ns#')
+        parts.append(f'        <category term="{xml_attr(og_type)}" scheme="http://ogp.me/ns#"/>')
     # Published date (from article metadata)
-    published_time = metadata.get('opengraph', {}).get('article:published_time')
+    published_time = og.get('article:published_time')
     if published_time:
         try:
-            pub_date = dateutil.parser.parse(published_time)
-            published_elem = SubElement(entry, 'published')
-            published_elem.text = pub_date.isoformat()
+            pub_date = parse_timestamp(published_time)
+            parts.append(f'        <published>{pub_date.isoformat()}</published>')
         except Exception:
             pass
     # Updated date
-    modified_time = metadata.get('opengraph', {}).get('article:modified_time')
+    has_updated = False
+    modified_time = og.get('article:modified_time')
     if modified_time:
         try:
-            mod_date = dateutil.parser.parse(modified_time)
-            updated_elem = entry.find('updated')
-            if updated_elem is None:
-                updated_elem = SubElement(entry, 'updated')
-            updated_elem.text = mod_date.isoformat()
+            mod_date = parse_timestamp(modified_time)
+            parts.append(f'        <updated>{mod_date.isoformat()}</updated>')
+            has_updated = True
         except Exception:
-            pass    # Author (from article metadata)
-    author_name = metadata.get('opengraph', {}).get('article:author')
-    twitter_creator = metadata.get('twitter', {}).get('creator')
+            pass
+    # Author (from article metadata)
+    author_name = og.get('article:author')
+    twitter_creator = tw.get('creator')
     
     # Always add author element (required by Atom spec)
-    author_elem = SubElement(entry, 'author')
-    SubElement(author_elem, 'name').text = author_name or twitter_creator or metadata.get('site_name', 'Unknown')
+    parts.append('        <author>')
+    parts.append(f'            <name>{xml_text(author_name or twitter_creator or metadata.get("site_name", "Unknown"))}</name>')
+    parts.append('        </author>')
     
     # Site name as source - properly structured according to Atom spec
     if metadata.get('site_name'):
-        source_elem = SubElement(entry, 'source')
+        parts.append('        <source>')
         # URI is required
         if metadata.get('url'):
-            source_link = SubElement(source_elem, 'link')
-            source_link.set('rel', 'alternate')
-            source_link.set('type', 'text/html')
-            source_link.set('href', metadata['url'])
-            
+            parts.append(f'            <link rel="alternate" type="text/html" href="{xml_attr(metadata["url"])}"/>')
         # Required sub-elements for source
-        source_title = SubElement(source_elem, 'title')
-        source_title.text = metadata['site_name']
-        
-        source_id = SubElement(source_elem, 'id')
-        source_id.text = 'urn:source:' + urlparse(metadata.get('url', '')).netloc
-        
-        source_updated = SubElement(source_elem, 'updated')
-        source_updated.text = datetime.now().replace(microsecond=0).isoformat() + 'Z'
+        parts.append(f'            <title>{xml_text(metadata["site_name"])}</title>')
+        netloc = metadata.get('_netloc')
+        if netloc is None:
+            netloc = urlparse(metadata.get('url', '')).netloc
+        parts.append(f'            <id>{source_id(netloc)}</id>')
+        parts.append(f'            <updated>{now_iso}</updated>')
+        parts.append('        </source>')
+    
+    # ID and updated are required by the Atom spec
+    parts.append(f'        <id>{xml_text(entry_id or metadata.get("url", ""))}</id>')
+    if not has_updated:
+        parts.append(f'        <updated>{now_iso}</updated>')
     
-    return entry
+    parts.append('    </entry>')
+    return parts
 
 # Usage example for enriching a feed
 def enrich_url_list_to_atom(urls):
-    """Convert a list of URLs to an enriched Atom feed"""
-    from xml.etree.ElementTree import Element, SubElement
-    
-    # Create feed root
-    feed = Element('feed')
-    feed.set('xmlns', 'http://www.w3.org/2005/Atom')      # Feed metadata
-    SubElement(feed, 'title').text = 'Enriched URL Feed'
-    # Generate a unique UUID for the feed
-    SubElement(feed, 'id').text = 'urn:uuid:' + str(uuid.uuid4())
-    SubElement(feed, 'updated').text = datetime.now().replace(microsecond=0).isoformat() + 'Z'
-    
-    # Add required self link (required by validators)
-    self_link = SubElement(feed, 'link')
-    self_link.set('rel', 'self')
-    self_link.set('type', 'application/atom+xml')
-    self_link.set('href', 'file:///enriched_feed.atom')
-    
-    for url in urls:
-        metadata = extract_metadata(url)
+    """Convert a list of URLs to an enriched Atom feed, returned as XML text"""
+    # Every entry in this run shares the same generation timestamp
+    now_iso = utc_now_iso()
+    
+    parts = [
+        "<?xml version='1.0' encoding='utf-8'?>",
+        '<feed xmlns="http://www.w3.org/2005/Atom">',
+        # Feed metadata
+        '    <title>Enriched URL Feed</title>',
+        # Generate a unique UUID for the feed
+        f'    <id>urn:uuid:{uuid.uuid4()}</id>',
+        f'    <updated>{now_iso}</updated>',
+        # Add required self link (required by validators)
+        '    <link rel="self" type="application/atom+xml" href="file:///enriched_feed.atom"/>',
+    ]
+    
+    results = asyncio.run(fetch_all_metadata(urls))
+    for url, metadata in zip(urls, results):
+        if isinstance(metadata, BaseException):
+            logging.warning(f"Failed to fetch {url}: {metadata}")
+            continue
         if 'error' not in metadata:
-            entry = enrich_atom_entry(metadata)            # Add required ID and updated if missing
-            if entry.find('id') is None:
-                id_elem = SubElement(entry, 'id')
-                id_elem.text = url.strip()  # Ensure no whitespace
-            if entry.find('updated') is None:
-                updated_elem = SubElement(entry, 'updated')
-                updated_elem.text = datetime.now().replace(microsecond=0).isoformat() + 'Z'
-                
-            feed.append(entry)
+            enrich_atom_entry(metadata, parts, now_iso=now_iso, entry_id=url.strip())
     
-    return feed
+    parts.append('</feed>')
+    return '\n'.join(parts) + '\n'
+
+def parse_sitemap_urls(content):
+    """
+    Stream the <loc> URLs out of a sitemap document.
+    
+    Elements are discarded as soon as they have been read so memory stays
+    flat however many entries the sitemap has.
+    
+    Args:
+        content (bytes): The raw sitemap XML
+        
+    Returns:
+        list: URLs in document order
+    """
+    urls = []
+    # {*} matches <loc> whether or not the sitemap declares the namespace
+    for _, elem in etree.iterparse(BytesIO(content), tag='{*}loc', recover=True):
+        if elem.text:
+            urls.append(elem.text.strip())
+        elem.clear()
+        # Drop the already processed <url> siblings too
+        parent = elem.getparent()
+        if parent is not None:
+            while parent.getprevious() is not None:
+                del parent.getparent()[0]
+    return urls
 
 if __name__ == "__main__":
     # Example usage
@@ -235,29 +682,16 @@ if __name__ == "__main__":
     logging.info(f"Domain extracted from sitemap URL: {domain}")
     logging.info(f"Starting Sitemap2Atom conversion for sitemap: {sitemap_url}")
     # Fetch URLs from the sitemap
-    response = requests.get(sitemap_url, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
+    response = SESSION.get(sitemap_url, timeout=10)
     response.raise_for_status()
-    soup = BeautifulSoup(response.content, 'xml')
-    urls = [url.text for url in soup.find_all('loc')]
+    urls = parse_sitemap_urls(response.content)
     logging.info(f"Found {len(urls)} URLs in the sitemap.")
     
     # Chop the URLs to a manageable size for testing
     urls = urls[:10]  # Limit to first 10 URLs for testing
     
     # Enrich each URL   
-    feed = enrich_url_list_to_atom(urls)    # Always format the output with pretty indentation and proper encoding
-    from xml.dom import minidom
-    import xml.etree.ElementTree as ET
-    
-    # Convert to string for output
-    rough_string = ET.tostring(feed, encoding='utf-8')
-    
-    # Use minidom to format properly
-    pretty_feed = minidom.parseString(rough_string)
-    formatted_xml = pretty_feed.toprettyxml(indent="    ", encoding='utf-8').decode('utf-8')
-    
-    # Remove extra whitespace that minidom adds
-    formatted_xml = '\n'.join([line for line in formatted_xml.split('\n') if line.strip()])
+    formatted_xml = enrich_url_list_to_atom(urls)
     
     print(formatted_xml)
 